@@ -4,36 +4,49 @@ Download and verify the first 10,000 decimal places of Pi from multiple sources.
 """
 
 import hashlib
+import mmap
 import os
 import re
+import shutil
+import ssl
 import sys
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+from http.client import HTTPException
 from pathlib import Path
 from urllib.request import Request, urlopen
-from urllib.error import URLError
 
 # Target number of decimal places
 TARGET_PLACES = 10_000
 
+# Repository root
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
 # Cache directory
-CACHE_DIR = Path(__file__).parent.parent / '.cache'
+CACHE_DIR = ROOT_DIR / '.cache'
+
+# Pre-calculated Pi digits shipped with the crate
+DECIMALS_RS_PATH = ROOT_DIR / 'src' / 'pi' / 'decimals.rs'
+
+# Known leading digits of Pi, used to locate the digit run in HTML pages
+_PI_PREFIX = b'3.1415926535'
+
+# Matches a run of digits
+_DIGITS_RE = re.compile(rb'\d+')
+
+# Every byte except ASCII digits, for stripping with bytes.translate
+_NON_DIGIT_BYTES = bytes(c for c in range(256) if c not in b'0123456789')
+
+# Matches the first character that is not an ASCII digit
+_NON_DIGIT_RE = re.compile(r'[^0-9]')
+
+# Fallback for pages where the known leading digits are not found
+_PI_FALLBACK_RE = re.compile(rb'3\.(\d{%d,})' % TARGET_PLACES)
 
 # User-Agent header to avoid 403 errors from some servers
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36'
 
-# Pi sources - using high-precision sources (1M digits) to avoid rounding issues
-SOURCES = [
-    {
-        'name': 'piday.org',
-        'url': 'https://www.piday.org/million/',
-        'parser': 'parse_html_continuous',
-    },
-    {
-        'name': 'damienelliott.com',
-        'url': 'https://www.damienelliott.com/1-million-digits-of-pi-%cf%80-ready-to-copy-and-paste/',
-        'parser': 'parse_html_continuous',
-    },
-]
-
 
 def ensure_cache_dir():
     """Ensure the cache directory exists."""
@@ -42,50 +55,76 @@ def ensure_cache_dir():
 
 def get_cache_path(url):
     """Get the cache file path for a given URL."""
-    url_hash = hashlib.md5(url.encode()).hexdigest()
+    url_hash = hashlib.blake2b(url.encode(), digest_size=16).hexdigest()
     return CACHE_DIR / f'pi_{url_hash}.html'
 
 
-def download_url(url):
+@cache
+def _ssl_context():
+    """
+    Get the TLS context shared by all downloads.
+
+    Built on first use, so certificates are loaded once and only when
+    something is actually downloaded.
+    """
+    return ssl.create_default_context()
+
+
+def download_url(name, url):
     """
     Download content from URL, using cache if available.
 
-    Returns the content as a string.
+    Status lines are prefixed with the source name, since sources are
+    fetched concurrently and their output interleaves.
+
+    Returns the raw content as bytes.
     """
     cache_path = get_cache_path(url)
 
     # Check cache first
     if cache_path.exists():
-        print(f'  Using cached file: {cache_path.name}')
-        with open(cache_path, 'r', encoding='utf-8') as f:
+        print(f'  [{name}] Using cached file: {cache_path.name}')
+        with open(cache_path, 'rb') as f:
             return f.read()
 
     # Download if not cached
-    print(f'  Downloading from {url}')
+    print(f'  [{name}] Downloading from {url}')
     try:
         # Use a browser User-Agent to avoid 403 errors
         headers = {'User-Agent': USER_AGENT}
         request = Request(url, headers=headers)
 
-        with urlopen(request, timeout=30) as response:
-            content = response.read().decode('utf-8')
-
-        # Cache the result
-        with open(cache_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-        print(f'  Cached to: {cache_path.name}')
+        # Only create the cache directory when there is something to write
+        ensure_cache_dir()
+
+        # Stream straight into the cache, via a temporary file so a failed
+        # download never leaves a truncated cache entry behind
+        partial_path = cache_path.with_suffix('.part')
+        try:
+            with urlopen(request, timeout=30, context=_ssl_context()) as response, open(partial_path, 'wb') as f:
+                shutil.copyfileobj(response, f, 1 << 16)
+            os.replace(partial_path, cache_path)
+        except BaseException:
+            partial_path.unlink(missing_ok=True)
+            raise
+        print(f'  [{name}] Cached to: {cache_path.name}')
+
+        with open(cache_path, 'rb') as f:
+            content = f.read()
 
         return content
-    except URLError as e:
-        print(f'  ERROR: Failed to download: {e}', file=sys.stderr)
+    except (OSError, HTTPException) as e:
+        print(f'  [{name}] ERROR: Failed to download: {e}', file=sys.stderr)
         return None
 
 
-def extract_digits(text):
+def extract_digits(data):
     """
-    Extract only digits from text, removing all other characters.
+    Extract only ASCII digits from bytes, removing all other characters.
+
+    Returns the digits as a string.
     """
-    return ''.join(c for c in text if c.isdigit())
+    return data.translate(None, _NON_DIGIT_BYTES).decode('ascii')
 
 
 def parse_html_continuous(content):
@@ -94,29 +133,45 @@ def parse_html_continuous(content):
 
     Works for piday.org, damienelliott.com, and similar formats.
 
-    Returns the decimal places (without the leading "3.").
+    Takes the raw page bytes. Returns the decimal places (without the
+    leading "3.") as a string.
     """
-    # Find the first occurrence of "3.1415926535..." pattern with known start
-    # This avoids false matches in HTML tags, metadata, etc.
-    match = re.search(r'3\.1415926535(\d{' + str(TARGET_PLACES - 10) + r',})', content)
-    if match:
-        # We matched starting from the 11th decimal, prepend the first 10
-        decimals = '1415926535' + match.group(1)
-        return decimals[:TARGET_PLACES]
+    # Find the first occurrence of "3.1415926535..." with a literal search,
+    # then take the digit run that follows. This avoids false matches in HTML
+    # tags, metadata, etc. without a backtracking regex over the whole page.
+    start = content.find(_PI_PREFIX)
+    while start != -1:
+        # Skip the leading "3." and take the following digits
+        match = _DIGITS_RE.match(content, start + 2)
+        if len(match.group(0)) >= TARGET_PLACES:
+            return match.group(0)[:TARGET_PLACES].decode('ascii')
+        start = content.find(_PI_PREFIX, match.end())
 
     # Try without the initial digits requirement
-    match = re.search(r'3\.(\d{' + str(TARGET_PLACES) + r',})', content)
+    match = _PI_FALLBACK_RE.search(content)
     if match:
         decimals = match.group(1)
-        return decimals[:TARGET_PLACES]
+        return decimals[:TARGET_PLACES].decode('ascii')
 
     return None
 
 
-# Map parser names to functions
-PARSERS = {
-    'parse_html_continuous': parse_html_continuous,
-}
+# A Pi source: display name, URL, and the parser for its content
+Source = namedtuple('Source', 'name url parser')
+
+# Pi sources - using high-precision sources (1M digits) to avoid rounding issues
+SOURCES = (
+    Source(
+        name='piday.org',
+        url='https://www.piday.org/million/',
+        parser=parse_html_continuous,
+    ),
+    Source(
+        name='damienelliott.com',
+        url='https://www.damienelliott.com/1-million-digits-of-pi-%cf%80-ready-to-copy-and-paste/',
+        parser=parse_html_continuous,
+    ),
+)
 
 
 def fetch_and_parse_source(source):
@@ -125,31 +180,37 @@ def fetch_and_parse_source(source):
 
     Returns (source_name, decimals) or (source_name, None) on error.
     """
-    name = source['name']
-    url = source['url']
-    parser_name = source['parser']
+    name = source.name
 
     print(f'\nFetching from {name}...')
 
-    content = download_url(url)
+    content = download_url(name, source.url)
     if content is None:
         return (name, None)
 
-    parser = PARSERS[parser_name]
-    decimals = parser(content)
+    decimals = source.parser(content)
 
     if decimals is None:
-        print(f'  WARNING: Failed to parse Pi digits from content', file=sys.stderr)
+        print(f'  [{name}] WARNING: Failed to parse Pi digits from content', file=sys.stderr)
         return (name, None)
 
     if len(decimals) < TARGET_PLACES:
-        print(f'  WARNING: Only found {len(decimals)} decimal places', file=sys.stderr)
+        print(f'  [{name}] WARNING: Only found {len(decimals)} decimal places', file=sys.stderr)
         return (name, None)
 
-    print(f'  Successfully extracted {len(decimals)} decimal places')
+    print(f'  [{name}] Successfully extracted {len(decimals)} decimal places')
     return (name, decimals)
 
 
+def first_difference(a, b):
+    """
+    Find the first position where two digit strings differ.
+
+    Returns the index, or None if one string is a prefix of the other.
+    """
+    return next((i for i, (d1, d2) in enumerate(zip(a, b)) if d1 != d2), None)
+
+
 def compare_results(results):
     """
     Compare results from all sources and verify they match.
@@ -173,16 +234,21 @@ def compare_results(results):
     # First, verify all are digits only
     print('\nValidating extracted decimals...')
     for name, decimals in valid_results:
-        if not decimals.isdigit():
+        bad = _NON_DIGIT_RE.search(decimals)
+        if bad:
             print(f'  ✗ {name}: Contains non-digit characters!', file=sys.stderr)
-            # Show first non-digit
-            for i, c in enumerate(decimals):
-                if not c.isdigit():
-                    print(f'    First non-digit at position {i}: {repr(c)}', file=sys.stderr)
-                    break
+            print(f'    First non-digit at position {bad.start()}: {repr(bad.group())}', file=sys.stderr)
         else:
             print(f'  ✓ {name}: All digits valid')
 
+    reference_name, reference_decimals = valid_results[0]
+
+    # Hash each source once; the detailed diagnostics are only needed on a mismatch
+    digests = [hashlib.blake2b(decimals.encode(), digest_size=16).digest() for _, decimals in valid_results]
+    if all(digest == digests[0] for digest in digests[1:]):
+        print('\n✓ All sources agree!')
+        return reference_decimals
+
     # Check lengths
     print('\nLengths:')
     for name, decimals in valid_results:
@@ -190,49 +256,54 @@ def compare_results(results):
         print(f'    First 20: {decimals[:20]}')
         print(f'    Last 20: {decimals[-20:]}')
 
-    reference_name, reference_decimals = valid_results[0]
-
-    all_match = True
     for name, decimals in valid_results[1:]:
         if decimals == reference_decimals:
             print(f'  ✓ {name} matches {reference_name}')
         else:
             print(f'  ✗ {name} DIFFERS from {reference_name}', file=sys.stderr)
             print(f'    Length: {len(decimals)} vs {len(reference_decimals)}', file=sys.stderr)
-            # Find first difference
-            for i, (d1, d2) in enumerate(zip(reference_decimals, decimals)):
-                if d1 != d2:
-                    print(f'    First difference at position {i}: {d1} vs {d2}', file=sys.stderr)
-                    break
-            all_match = False
-
-    if not all_match:
-        print('\nERROR: Sources disagree on Pi digits!', file=sys.stderr)
-        return None
+            i = first_difference(reference_decimals, decimals)
+            if i is not None:
+                print(f'    First difference at position {i}: {reference_decimals[i]} vs {decimals[i]}', file=sys.stderr)
 
-    print('\n✓ All sources agree!')
-    return reference_decimals
+    print('\nERROR: Sources disagree on Pi digits!', file=sys.stderr)
+    return None
 
 
 def parse_decimals_rs(file_path):
     """
-    Parse the PI_DECIMALS array from src/c_pi/decimals.rs.
+    Parse the PI_DECIMALS array from src/pi/decimals.rs.
 
     Returns the decimal places as a string, or None if parsing fails.
     """
     try:
-        with open(file_path, 'r') as f:
-            content = f.read()
-
-        # Find the PI_DECIMALS array definition
-        # Look for: pub const PI_DECIMALS: [u8; 10_000] = [
-        match = re.search(r'pub const PI_DECIMALS:\s*\[u8;\s*\d+_?\d*\]\s*=\s*\[([\d,\s]+)\];', content, re.DOTALL)
-        if not match:
+        with open(file_path, 'rb') as f:
+            # An empty file cannot be mapped and has nothing to parse
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+
+            # Map the file rather than reading it into memory
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                # Find the PI_DECIMALS array definition
+                # Look for: pub const PI_DECIMALS: [u8; 10_000] = [
+                key = content.find(b'pub const PI_DECIMALS:')
+                if key == -1:
+                    return None
+                equals = content.find(b'=', key)
+                if equals == -1:
+                    return None
+                start = content.find(b'[', equals)
+                end = content.find(b'];', start)
+                if start == -1 or end == -1:
+                    return None
+
+                # Extract the array contents
+                array_str = content[start + 1:end]
+
+        # Only digits, commas and whitespace are allowed inside the array
+        if array_str.translate(None, b'0123456789, \t\n\r\x0b\x0c'):
             return None
 
-        # Extract the array contents
-        array_str = match.group(1)
-
         # Extract all digits, ignoring commas and whitespace
         digits = extract_digits(array_str)
 
@@ -254,7 +325,7 @@ def main():
     print(f'  2. Cache downloaded files in {CACHE_DIR}')
     print(f'  3. Parse and extract the first {TARGET_PLACES:,} decimal places')
     print(f'  4. Cross-verify all sources agree')
-    print(f'  5. Verify against src/c_pi/decimals.rs if it exists')
+    print(f'  5. Verify against src/pi/decimals.rs if it exists')
     print()
 
     response = input('Do you want to continue (y/N)? ').strip().lower()
@@ -262,13 +333,9 @@ def main():
         print('Aborted.')
         return 0
 
-    ensure_cache_dir()
-
-    # Fetch and parse all sources
-    results = []
-    for source in SOURCES:
-        result = fetch_and_parse_source(source)
-        results.append(result)
+    # Fetch and parse all sources concurrently, results keep source order
+    with ThreadPoolExecutor(max_workers=len(SOURCES)) as executor:
+        results = list(executor.map(fetch_and_parse_source, SOURCES))
 
     # Compare and verify
     verified_decimals = compare_results(results)
@@ -282,10 +349,9 @@ def main():
     print(f'\nTotal decimal places: {len(verified_decimals):,}')
 
     # Check if decimals.rs exists and verify it
-    decimals_rs_path = Path(__file__).parent.parent / 'src' / 'c_pi' / 'decimals.rs'
-    if decimals_rs_path.exists():
+    if DECIMALS_RS_PATH.exists():
         print(f'\nVerifying existing decimals.rs...')
-        existing_decimals = parse_decimals_rs(decimals_rs_path)
+        existing_decimals = parse_decimals_rs(DECIMALS_RS_PATH)
 
         if existing_decimals is None:
             print(f'  WARNING: Failed to parse decimals.rs', file=sys.stderr)
@@ -298,23 +364,23 @@ def main():
             else:
                 print(f'  ✗ decimals.rs DIFFERS from verified Pi digits!', file=sys.stderr)
 
-                # Find first difference
-                min_len = min(len(existing_decimals), len(verified_decimals))
-                for i in range(min_len):
-                    if existing_decimals[i] != verified_decimals[i]:
-                        print(f'    First difference at position {i}: {existing_decimals[i]} vs {verified_decimals[i]}', file=sys.stderr)
-                        print(f'      decimals.rs: ...{existing_decimals[max(0,i-10):i+10]}...', file=sys.stderr)
-                        print(f'      verified:    ...{verified_decimals[max(0,i-10):i+10]}...', file=sys.stderr)
-                        break
+                i = first_difference(existing_decimals, verified_decimals)
+                if i is not None:
+                    print(f'    First difference at position {i}: {existing_decimals[i]} vs {verified_decimals[i]}', file=sys.stderr)
+                    print(f'      decimals.rs: ...{existing_decimals[max(0,i-10):i+10]}...', file=sys.stderr)
+                    print(f'      verified:    ...{verified_decimals[max(0,i-10):i+10]}...', file=sys.stderr)
 
                 if len(existing_decimals) != len(verified_decimals):
                     print(f'    Length difference: {len(existing_decimals)} vs {len(verified_decimals)}', file=sys.stderr)
     else:
-        print(f'\nNote: decimals.rs not found at {decimals_rs_path}')
+        print(f'\nNote: decimals.rs not found at {DECIMALS_RS_PATH}')
 
     # Output to stdout for piping
     print(f'\nFull output:')
-    print(verified_decimals)
+    # Write the digits in one block-buffered write, after flushing the status text
+    sys.stdout.flush()
+    sys.stdout.buffer.write(verified_decimals.encode('ascii') + b'\n')
+    sys.stdout.buffer.flush()
     return 0
 
 